@@ -0,0 +1,157 @@
+"""
+Dream analysis engine for the AI Dream Journal Analyzer
+
+Kept out of app.py because Streamlit re-executes the app script on every
+rerun: state defined here (keyword index, caches, the worker pool) lives for
+the whole process, and functions here can be pickled into worker processes.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from textblob.sentiments import PatternAnalyzer
+
+from config import Config
+
+# TextBlob's default sentiment analyzer, called directly to skip building a
+# TextBlob (tokenizer, tagger, lazy properties) for every dream
+sentiment_analyzer = PatternAnalyzer()
+
+@lru_cache(maxsize=512)
+def sentiment_scores(text):
+    """TextBlob (polarity, subjectivity) for a dream text"""
+    sentiment = sentiment_analyzer.analyze(text)
+    return sentiment.polarity, sentiment.subjectivity
+
+def count_words(text):
+    """Whitespace-delimited word count, without splitting into a list when possible"""
+    # isprintable() rules out every whitespace character except ' ', so text
+    # that is single-spaced and trimmed has exactly one more word than spaces
+    if text and text.isprintable() and '  ' not in text and text[0] != ' ' and text[-1] != ' ':
+        return text.count(' ') + 1
+    return len(text.split())
+
+# Batches larger than this are analyzed across worker processes
+PARALLEL_ANALYSIS_MIN_DREAMS = 50
+
+# One bit per theme, so a dream's themes fit in a single uint16
+THEME_INDEX = {theme: 1 << i for i, theme in enumerate(Config.DREAM_THEMES)}
+
+def mask_to_themes(mask):
+    """Expand a theme bitmask back into theme names"""
+    return [theme for theme, bit in THEME_INDEX.items() if mask & bit]
+
+def theme_counts(masks):
+    """Count how many dreams contain each theme, in THEME_INDEX order"""
+    masks = np.asarray(masks, dtype=np.uint16)
+    bits = (masks[:, None] >> np.arange(len(THEME_INDEX), dtype=np.uint16)) & 1
+    return bits.sum(axis=0)
+
+class DreamAnalyzer:
+    # Keyword sets come from Config and are frozen once per class, not rebuilt
+    # per call; the emotion/theme order is Config's and breaks ties
+    _emotion_keywords = {emotion: frozenset(keywords)
+                         for emotion, keywords in Config.EMOTION_KEYWORDS.items()}
+    _theme_keywords = {theme: frozenset(keywords)
+                       for theme, keywords in Config.DREAM_THEMES.items()}
+    emotions = tuple(_emotion_keywords)
+    dream_themes = tuple(_theme_keywords)
+
+    _token_pattern = re.compile(r'[a-z]+')
+    _sibilant_plurals = ('ses', 'xes', 'zes', 'ches', 'shes')
+    
+    def _scan(self, text):
+        """Count the distinct keywords of each emotion/theme present in the text"""
+        # One tokenization; each category is then a C-level set intersection
+        tokens = set(self._token_pattern.findall(text.lower()))
+        # Keywords are singular, so plurals also count as their stem
+        # ('dogs' -> 'dog', 'buses' -> 'bus', 'stories' -> 'story'). 'es' is
+        # only dropped after a sibilant, so 'cares' is not read as 'car'
+        tokens.update([token[:-1] for token in tokens if token.endswith('s')]
+                      + [token[:-2] for token in tokens if token.endswith(self._sibilant_plurals)]
+                      + [token[:-3] + 'y' for token in tokens if token.endswith('ies')])
+        counts = {emotion: len(tokens & keywords)
+                  for emotion, keywords in self._emotion_keywords.items()}
+        counts.update((theme, len(tokens & keywords))
+                      for theme, keywords in self._theme_keywords.items())
+        return counts
+    
+    def analyze_sentiment(self, text):
+        polarity, subjectivity = sentiment_scores(text)
+        return {
+            'polarity': polarity,
+            'subjectivity': subjectivity,
+            'emotion': self.get_dominant_emotion(text)
+        }
+    
+    def analyze_dream(self, text):
+        """Sentiment, dominant emotion and theme mask from a single keyword scan"""
+        counts = self._scan(text)
+        polarity, subjectivity = sentiment_scores(text)
+        return {
+            'polarity': polarity,
+            'subjectivity': subjectivity,
+            'emotion': self.get_dominant_emotion(text, counts),
+            'themes_mask': self.extract_theme_mask(text, counts)
+        }
+    
+    def analyze_many(self, texts):
+        """Analyze a batch of dreams, e.g. a re-imported journal"""
+        # Small batches aren't worth the inter-process round trip
+        if len(texts) <= PARALLEL_ANALYSIS_MIN_DREAMS:
+            return [self.analyze_dream(text) for text in texts]
+        return list(get_process_pool().map(analyze_dream_text, texts, chunksize=64))
+    
+    def get_dominant_emotion(self, text, counts=None):
+        counts = self._scan(text) if counts is None else counts
+        dominant, best = 'neutral', 0
+        for emotion in self.emotions:
+            if counts[emotion] > best:
+                dominant, best = emotion, counts[emotion]
+        
+        return dominant
+    
+    def extract_theme_mask(self, text, counts=None):
+        counts = self._scan(text) if counts is None else counts
+        mask = 0
+        for theme, bit in THEME_INDEX.items():
+            if counts[theme]:
+                mask |= bit
+        return mask
+    
+    def extract_themes(self, text, counts=None):
+        return mask_to_themes(self.extract_theme_mask(text, counts))
+    
+    def predict_next_dream(self, dreams_df):
+        if len(dreams_df) < 3:
+            return "Need more dreams for prediction"
+        
+        recent = dreams_df.tail(5)
+        emotion_counts = recent['emotion'].value_counts()
+        recent_theme_counts = theme_counts(recent['themes_mask'])
+        
+        predicted_emotion = emotion_counts.idxmax() if not emotion_counts.empty else 'neutral'
+        predicted_theme = 'unknown'
+        if recent_theme_counts.any():
+            # Ties go to the theme seen first, scanning dreams oldest to newest
+            top = recent_theme_counts == recent_theme_counts.max()
+            top_bits = sum(bit for bit, is_top in zip(THEME_INDEX.values(), top) if is_top)
+            first = next(mask for mask in recent['themes_mask'] if mask & top_bits)
+            predicted_theme = mask_to_themes(first & top_bits)[0]
+        
+        return f"Likely emotion: {predicted_emotion}, Likely theme: {predicted_theme}"
+
+def analyze_dream_text(text):
+    """Process pool entry point: analyze one dream in a worker"""
+    return DreamAnalyzer().analyze_dream(text)
+
+_process_pool = None
+
+def get_process_pool():
+    """Worker processes for bulk analysis, created on first use"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _process_pool
@@ -4,13 +4,15 @@ import numpy as np
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
-from textblob import TextBlob
-import re
-from collections import Counter
 import json
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from sklearn.decomposition import LatentDirichletAllocation
+import csv
+import array
+import io
+import orjson
+from analyzer import (
+    THEME_INDEX, DreamAnalyzer, count_words, mask_to_themes, sentiment_analyzer, theme_counts
+)
+from typing import Final
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -23,7 +25,7 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
+CUSTOM_CSS: Final = """
 <style>
     .main-header {
         font-size: 3rem;
@@ -45,86 +47,88 @@ st.markdown("""
         text-align: center;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-class DreamAnalyzer:
-    def __init__(self):
-        self.emotions = ['joy', 'fear', 'anger', 'sadness', 'surprise', 'love', 'anxiety']
-        self.dream_themes = ['flying', 'falling', 'chase', 'water', 'animals', 'death', 'school', 'work', 'family']
-    
-    def analyze_sentiment(self, text):
-        blob = TextBlob(text)
-        return {
-            'polarity': blob.sentiment.polarity,
-            'subjectivity': blob.sentiment.subjectivity,
-            'emotion': self.get_dominant_emotion(text)
-        }
-    
-    def get_dominant_emotion(self, text):
-        emotion_keywords = {
-            'joy': ['happy', 'joy', 'excited', 'wonderful', 'amazing', 'great', 'love'],
-            'fear': ['scared', 'afraid', 'terrified', 'nightmare', 'horror', 'panic'],
-            'anger': ['angry', 'mad', 'furious', 'rage', 'annoyed', 'frustrated'],
-            'sadness': ['sad', 'depressed', 'crying', 'tears', 'lonely', 'grief'],
-            'anxiety': ['worried', 'anxious', 'nervous', 'stress', 'tension', 'uneasy']
-        }
-        
-        text_lower = text.lower()
-        emotion_scores = {}
-        
-        for emotion, keywords in emotion_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text_lower)
-            emotion_scores[emotion] = score
-        
-        return max(emotion_scores, key=emotion_scores.get) if max(emotion_scores.values()) > 0 else 'neutral'
-    
-    def extract_themes(self, text):
-        theme_keywords = {
-            'flying': ['fly', 'flying', 'soar', 'wings', 'air', 'sky'],
-            'falling': ['fall', 'falling', 'drop', 'cliff', 'height'],
-            'chase': ['chase', 'run', 'escape', 'pursue', 'follow'],
-            'water': ['water', 'ocean', 'river', 'swim', 'drown', 'flood'],
-            'animals': ['dog', 'cat', 'bird', 'snake', 'lion', 'animal'],
-            'death': ['death', 'die', 'dead', 'funeral', 'grave'],
-            'school': ['school', 'teacher', 'exam', 'classroom', 'student'],
-            'work': ['work', 'office', 'boss', 'meeting', 'job'],
-            'family': ['mother', 'father', 'family', 'parent', 'sibling']
-        }
-        
-        text_lower = text.lower()
-        found_themes = []
-        
-        for theme, keywords in theme_keywords.items():
-            if any(keyword in text_lower for keyword in keywords):
-                found_themes.append(theme)
-        
-        return found_themes
-    
-    def predict_next_dream(self, dreams_df):
-        if len(dreams_df) < 3:
-            return "Need more dreams for prediction"
-        
-        recent_emotions = dreams_df.tail(5)['emotion'].tolist()
-        recent_themes = []
-        for themes in dreams_df.tail(5)['themes']:
-            recent_themes.extend(themes)
-        
-        emotion_counter = Counter(recent_emotions)
-        theme_counter = Counter(recent_themes)
-        
-        predicted_emotion = emotion_counter.most_common(1)[0][0] if emotion_counter else 'neutral'
-        predicted_theme = theme_counter.most_common(1)[0][0] if theme_counter else 'unknown'
-        
-        return f"Likely emotion: {predicted_emotion}, Likely theme: {predicted_theme}"
+PREDICTION_CARD: Final = """
+<div class="dream-card">
+    <h3>🌟 Next Dream Prediction</h3>
+    <p>{prediction}</p>
+</div>
+"""
+
+# Streamlit clears elements that a rerun does not re-emit, so the CSS has to
+# be written on every run rather than once per session
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+@st.cache_resource(show_spinner=False)
+def get_analyzer():
+    """One DreamAnalyzer per server process"""
+    # TextBlob loads its sentiment lexicon on first use; do it here so the
+    # first submitted dream doesn't pay for it
+    sentiment_analyzer.analyze("warm up")
+    return DreamAnalyzer()
+
+def new_journal():
+    """Empty columnar dream journal: one list or typed array per field"""
+    return {
+        'date': [],  # np.datetime64 days, parsed once at insert
+        'text': [],
+        'polarity': array.array('d'),
+        'subjectivity': array.array('d'),
+        'emotion': [],
+        'themes_mask': array.array('H'),
+        'lucid': array.array('b'),
+        'sleep_quality': array.array('b'),
+        'word_count': array.array('I')
+    }
+
+def journal_size(journal):
+    """Number of dreams recorded in a journal"""
+    return len(journal['date'])
+
+def add_dream(journal, dream_entry):
+    """Append one dream to every column of the journal"""
+    for key, column in journal.items():
+        column.append(dream_entry[key])
+
+def get_dreams_df():
+    """Return the session's dreams as a DataFrame, rebuilt only after a dream is added"""
+    journal = st.session_state.dreams
+    size = journal_size(journal)
+    if st.session_state.get('dreams_df_size') != size:
+        # Typed arrays are copied: a NumPy view would pin their buffers and
+        # make the next append raise BufferError
+        columns = {key: np.array(column) if isinstance(column, array.array) else column
+                   for key, column in journal.items()}
+        columns['date'] = np.array(journal['date'], dtype='datetime64[D]')
+        df = pd.DataFrame(columns, copy=False)
+        df['lucid'] = df['lucid'].astype(bool)
+        st.session_state.dreams_df = df
+        st.session_state.dreams_df_size = size
+    return st.session_state.dreams_df
+
+def export_records(journal):
+    """Dreams as plain dicts for export, with theme names in place of the bitmask"""
+    fields = ['themes' if key == 'themes_mask' else key for key in journal]
+    records = []
+    for row in zip(*journal.values()):
+        record = dict(zip(fields, row))
+        record['date'] = str(record['date'])
+        record['themes'] = mask_to_themes(record['themes'])
+        record['lucid'] = bool(record['lucid'])
+        records.append(record)
+    return records
 
 def main():
     st.markdown('<h1 class="main-header">🌙 AI Dream Journal Analyzer</h1>', unsafe_allow_html=True)
     
-    analyzer = DreamAnalyzer()
+    analyzer = get_analyzer()
     
     # Initialize session state
     if 'dreams' not in st.session_state:
-        st.session_state.dreams = []
+        st.session_state.dreams = new_journal()
     
     # Sidebar
     st.sidebar.title("Navigation")
@@ -146,31 +150,32 @@ def main():
         if st.button("Analyze & Save Dream", type="primary"):
             if dream_text:
                 # Analyze the dream
-                sentiment = analyzer.analyze_sentiment(dream_text)
-                themes = analyzer.extract_themes(dream_text)
+                analysis = analyzer.analyze_dream(dream_text)
+                themes_mask = analysis['themes_mask']
+                themes = mask_to_themes(themes_mask)
                 
                 dream_entry = {
-                    'date': dream_date.strftime('%Y-%m-%d'),
+                    'date': np.datetime64(dream_date, 'D'),
                     'text': dream_text,
-                    'polarity': sentiment['polarity'],
-                    'subjectivity': sentiment['subjectivity'],
-                    'emotion': sentiment['emotion'],
-                    'themes': themes,
+                    'polarity': analysis['polarity'],
+                    'subjectivity': analysis['subjectivity'],
+                    'emotion': analysis['emotion'],
+                    'themes_mask': themes_mask,
                     'lucid': lucid,
                     'sleep_quality': sleep_quality,
-                    'word_count': len(dream_text.split())
+                    'word_count': count_words(dream_text)
                 }
                 
-                st.session_state.dreams.append(dream_entry)
+                add_dream(st.session_state.dreams, dream_entry)
                 
                 # Display analysis
                 st.success("Dream analyzed and saved!")
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Emotion", sentiment['emotion'].title())
+                    st.metric("Emotion", analysis['emotion'].title())
                 with col2:
-                    st.metric("Sentiment", f"{sentiment['polarity']:.2f}")
+                    st.metric("Sentiment", f"{analysis['polarity']:.2f}")
                 with col3:
                     st.metric("Themes Found", len(themes))
                 
@@ -182,12 +187,11 @@ def main():
     elif page == "Analytics":
         st.header("📊 Dream Analytics")
         
-        if not st.session_state.dreams:
+        if not journal_size(st.session_state.dreams):
             st.warning("No dreams recorded yet. Add some dreams to see analytics!")
             return
         
-        df = pd.DataFrame(st.session_state.dreams)
-        df['date'] = pd.to_datetime(df['date'])
+        df = get_dreams_df()
         
         # Overview metrics
         col1, col2, col3, col4 = st.columns(4)
@@ -220,13 +224,11 @@ def main():
             st.plotly_chart(fig_sentiment, use_container_width=True)
         
         # Theme analysis
-        all_themes = []
-        for themes in df['themes']:
-            all_themes.extend(themes)
+        counts = pd.Series(theme_counts(df['themes_mask']), index=list(THEME_INDEX))
+        counts = counts[counts > 0].sort_values(ascending=False)
         
-        if all_themes:
-            theme_counts = Counter(all_themes)
-            fig_themes = px.bar(x=list(theme_counts.keys()), y=list(theme_counts.values()),
+        if not counts.empty:
+            fig_themes = px.bar(x=counts.index, y=counts.values,
                               title="Most Common Dream Themes")
             st.plotly_chart(fig_themes, use_container_width=True)
         
@@ -239,32 +241,25 @@ def main():
     elif page == "Predictions":
         st.header("🔮 Dream Predictions")
         
-        if len(st.session_state.dreams) < 3:
+        if journal_size(st.session_state.dreams) < 3:
             st.warning("Need at least 3 dreams for predictions!")
             return
         
-        df = pd.DataFrame(st.session_state.dreams)
+        df = get_dreams_df()
         prediction = analyzer.predict_next_dream(df)
         
-        st.markdown(f"""
-        <div class="dream-card">
-            <h3>🌟 Next Dream Prediction</h3>
-            <p>{prediction}</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(PREDICTION_CARD.format(prediction=prediction), unsafe_allow_html=True)
         
         # Pattern analysis
         st.subheader("📈 Pattern Analysis")
         
         # Weekly patterns
-        df['date'] = pd.to_datetime(df['date'])
-        df['weekday'] = df['date'].dt.day_name()
-        
-        weekday_sentiment = df.groupby('weekday')['polarity'].mean().reindex([
-            'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'
-        ])
+        weekday = df['date'].dt.weekday.to_numpy()
+        totals = np.bincount(weekday, weights=df['polarity'].to_numpy(dtype=float), minlength=7)
+        counts = np.bincount(weekday, minlength=7)
+        weekday_sentiment = np.divide(totals, counts, out=np.full(7, np.nan), where=counts > 0)
         
-        fig_weekly = px.bar(x=weekday_sentiment.index, y=weekday_sentiment.values,
+        fig_weekly = px.bar(x=WEEKDAYS, y=weekday_sentiment,
                            title="Average Sentiment by Day of Week")
         st.plotly_chart(fig_weekly, use_container_width=True)
         
@@ -282,34 +277,38 @@ def main():
     elif page == "Export Data":
         st.header("📤 Export Your Data")
         
-        if not st.session_state.dreams:
+        if not journal_size(st.session_state.dreams):
             st.warning("No dreams to export!")
             return
         
-        df = pd.DataFrame(st.session_state.dreams)
+        records = export_records(st.session_state.dreams)
+        today_tag = datetime.now().strftime('%Y%m%d')
         
         # Display data
         st.subheader("Your Dream Data")
-        st.dataframe(df)
+        st.dataframe(pd.DataFrame(records))
         
         # Export options
         col1, col2 = st.columns(2)
         
         with col1:
-            csv = df.to_csv(index=False)
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=list(records[0]))
+            writer.writeheader()
+            writer.writerows(records)
             st.download_button(
                 label="Download as CSV",
-                data=csv,
-                file_name=f"dreams_{datetime.now().strftime('%Y%m%d')}.csv",
+                data=buffer.getvalue(),
+                file_name=f"dreams_{today_tag}.csv",
                 mime="text/csv"
             )
         
         with col2:
-            json_data = df.to_json(orient='records', indent=2)
+            json_data = orjson.dumps(records, option=orjson.OPT_INDENT_2)
             st.download_button(
                 label="Download as JSON",
                 data=json_data,
-                file_name=f"dreams_{datetime.now().strftime('%Y%m%d')}.json",
+                file_name=f"dreams_{today_tag}.json",
                 mime="application/json"
             )
 
@@ -84,8 +84,7 @@ class Config:
         ],
         'fear': [
             'scared', 'afraid', 'terrified', 'nightmare', 'horror',
-            'panic', 'frightened', 'anxious', 'worried', 'nervous',
-            'dread', 'terror', 'phobia', 'fearful'
+            'panic', 'frightened', 'dread', 'terror', 'phobia', 'fearful'
         ],
         'anger': [
             'angry', 'mad', 'furious', 'rage', 'annoyed', 'frustrated',
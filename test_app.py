@@ -4,12 +4,19 @@ Unit tests for AI Dream Journal Analyzer
 import unittest
 import sys
 import os
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import json
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
 
 # Add the current directory to the path to import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from analyzer import (
+    PARALLEL_ANALYSIS_MIN_DREAMS, THEME_INDEX, DreamAnalyzer, count_words, mask_to_themes, theme_counts
+)
 from utils import (
     DataValidator, DataProcessor, ErrorHandler, 
     AdvancedAnalyzer, export_dreams_advanced, calculate_dream_statistics
@@ -48,6 +55,15 @@ class TestDataValidator(unittest.TestCase):
         self.assertFalse(is_valid)
         self.assertIn("too long", message)
     
+    def test_validate_dream_text_harmful(self):
+        """Test script and event-handler content is rejected"""
+        for text in ["I dreamed <script>\nalert(1)\n</script> last night",
+                     "A link to javascript:void(0) in my dream",
+                     "<img src=x onerror = alert(1)> in a dream"]:
+            is_valid, message = self.validator.validate_dream_text(text)
+            self.assertFalse(is_valid)
+            self.assertIn("Invalid characters", message)
+
     def test_validate_sleep_quality_valid(self):
         """Test valid sleep quality"""
         is_valid, message = self.validator.validate_sleep_quality(7)
@@ -69,11 +85,30 @@ class TestDataValidator(unittest.TestCase):
     
     def test_validate_date_future(self):
         """Test future date"""
-        from datetime import timedelta
         future_date = date.today() + timedelta(days=1)
         is_valid, message = self.validator.validate_date(future_date)
         self.assertFalse(is_valid)
         self.assertIn("cannot be in the future", message)
+    
+    def test_validate_dates(self):
+        """Test bulk date validation"""
+        today = date.today()
+        dates = [today, today + timedelta(days=1), today - timedelta(days=4000),
+                 (today - timedelta(days=30)).isoformat()]
+        mask = self.validator.validate_dates(dates)
+        self.assertEqual(mask.tolist(), [self.validator.validate_date(d)[0] for d in dates[:3]] + [True])
+    
+    def test_validate_dates_unparsable(self):
+        """Test unparsable dates are invalid without failing the batch"""
+        mask = self.validator.validate_dates([date.today(), 'not a date', None])
+        self.assertEqual(mask.tolist(), [True, False, False])
+    
+    def test_validate_dates_mixed_offsets(self):
+        """Test mixed UTC offsets and non-ISO strings don't fail the batch"""
+        day = date.today() - timedelta(days=30)
+        dates = [f"{day.isoformat()}T00:00:00+05:00", day.isoformat(), day.strftime('%m/%d/%Y')]
+        mask = self.validator.validate_dates(dates)
+        self.assertEqual(mask.tolist(), [True, True, False])
 
 class TestDataProcessor(unittest.TestCase):
     """Test the DataProcessor class"""
@@ -101,6 +136,17 @@ class TestDataProcessor(unittest.TestCase):
         self.assertNotIn("was", keywords)
         self.assertNotIn("the", keywords)
         self.assertNotIn("and", keywords)
+    
+    def test_batch_processing(self):
+        """Test batch cleaning and keyword extraction"""
+        texts = ["  Flying   over @ mountains!  ", "", "Swimming with dolphins in the ocean"]
+        
+        self.assertEqual(self.processor.clean_texts(texts),
+                         ["Flying over  mountains!", "", "Swimming with dolphins in the ocean"])
+        
+        keywords = [sorted(words) for words in self.processor.extract_keywords_batch(texts)]
+        self.assertEqual(keywords, [['flying', 'mountains', 'over'], [],
+                                    ['dolphins', 'ocean', 'swimming']])
 
 class TestAdvancedAnalyzer(unittest.TestCase):
     """Test the AdvancedAnalyzer class"""
@@ -128,6 +174,28 @@ class TestAdvancedAnalyzer(unittest.TestCase):
         self.assertGreater(result['complexity_score'], 0)
         self.assertLessEqual(result['complexity_score'], 100)
     
+    def test_analyze_dream_complexity_batch(self):
+        """Test batch complexity values without filling the cache"""
+        texts = ["I was flying over the ocean.", "A dog chased me through the forest. I hid."]
+        
+        results = self.analyzer.analyze_dream_complexity_batch(texts)
+        
+        # 'ocean' and 'fly'; 'dog' and 'forest' are the dream symbols found
+        self.assertEqual([(r['word_count'], r['sentence_count']) for r in results], [(6, 1), (9, 2)])
+        self.assertEqual([r['symbol_density'] for r in results], [33.3, 22.2])
+        self.assertEqual([r['complexity_score'] for r in results], [43.5, 39.2])
+        self.assertEqual(len(self.analyzer._complexity_cache), 0)
+    
+    def test_analyze_dream_prepares_once(self):
+        """Test a first analysis prepares the text once and reuses it on a repeat"""
+        dream_text = "I was flying over the ocean. I realized it was a dream."
+        
+        with patch.object(self.analyzer, '_prepare', wraps=self.analyzer._prepare) as prepare:
+            first = self.analyzer.analyze_dream(dream_text)
+            self.assertEqual(prepare.call_count, 1)
+            self.assertEqual(self.analyzer.analyze_dream(dream_text), first)
+            self.assertEqual(prepare.call_count, 2)
+    
     def test_detect_lucidity_indicators(self):
         """Test lucidity detection"""
         lucid_text = "I realized I was dreaming and took control of the dream"
@@ -140,6 +208,76 @@ class TestAdvancedAnalyzer(unittest.TestCase):
         self.assertGreater(lucid_result['probability'], non_lucid_result['probability'])
         self.assertTrue(lucid_result['likely_lucid'])
         self.assertFalse(non_lucid_result['likely_lucid'])
+    
+    def test_analyze_dream(self):
+        """Test the combined analysis matches the individual methods"""
+        dream_text = "I realized I was dreaming. Then I flew over the ocean and a forest."
+        
+        result = self.analyzer.analyze_dream(dream_text)
+        
+        self.assertEqual(result['complexity'], self.analyzer.analyze_dream_complexity(dream_text))
+        self.assertEqual(result['lucidity'], self.analyzer.detect_lucidity_indicators(dream_text))
+
+class TestDreamAnalyzer(unittest.TestCase):
+    """Test the DreamAnalyzer keyword matching"""
+    
+    def setUp(self):
+        self.analyzer = DreamAnalyzer()
+    
+    def test_extract_themes_plurals(self):
+        """Test plural words match their singular keywords"""
+        themes = self.analyzer.extract_themes("I saw dogs and flew over rivers")
+        self.assertEqual(themes, ['water', 'animals'])
+    
+    def test_extract_themes_plural_false_positives(self):
+        """Test 'es' is only stripped from sibilant plurals"""
+        self.assertEqual(self.analyzer.extract_themes("Nobody cares about me"), [])
+        self.assertEqual(self.analyzer.extract_themes("I read ancient runes"), [])
+        self.assertEqual(self.analyzer.extract_themes("Two buses and the lunches"), ['vehicle', 'food'])
+    
+    def test_extract_themes_whole_words(self):
+        """Test keywords only match whole words"""
+        self.assertEqual(self.analyzer.extract_themes("I sat on a chair"), [])
+    
+    def test_dominant_emotion_anxiety(self):
+        """Test anxiety words are not counted as fear"""
+        emotion = self.analyzer.get_dominant_emotion("I was anxious and nervous before the exam")
+        self.assertEqual(emotion, 'anxiety')
+
+    def test_predict_next_dream_theme_tie(self):
+        """Test tied themes go to the first one seen"""
+        masks = [THEME_INDEX['water'], THEME_INDEX['flying'],
+                 THEME_INDEX['water'] | THEME_INDEX['flying']]
+        df = pd.DataFrame({'emotion': ['joy', 'fear', 'joy'], 'themes_mask': masks})
+        
+        prediction = self.analyzer.predict_next_dream(df)
+        
+        self.assertEqual(prediction, "Likely emotion: joy, Likely theme: water")
+
+    def test_analyze_many(self):
+        """Test batch analysis matches single analysis on both sides of the pool threshold"""
+        texts = ["I was flying over the ocean", "A dog chased me and I was scared",
+                 "I was anxious about my exam at school"]
+        
+        for size in (PARALLEL_ANALYSIS_MIN_DREAMS, PARALLEL_ANALYSIS_MIN_DREAMS + 1):
+            batch = [texts[i % len(texts)] for i in range(size)]
+            self.assertEqual(self.analyzer.analyze_many(batch),
+                             [self.analyzer.analyze_dream(text) for text in batch])
+    
+    def test_count_words(self):
+        """Test the single-space fast path agrees with split()"""
+        for text in ["I was flying", "I  was flying", " I was flying ", "I was\tflying\n", "word", ""]:
+            self.assertEqual(count_words(text), len(text.split()))
+    
+    def test_theme_mask_round_trip(self):
+        """Test theme bitmasks expand and count back to their themes"""
+        themes = ['flying', 'water', 'food']
+        mask = sum(THEME_INDEX[theme] for theme in themes)
+        self.assertEqual(mask_to_themes(mask), themes)
+        
+        counts = theme_counts([mask, THEME_INDEX['water'], 0])
+        expected = [2 if theme == 'water' else int(theme in themes) for theme in THEME_INDEX]
+        self.assertEqual(counts.tolist(), expected)
 
 class TestExportFunctions(unittest.TestCase):
     """Test export and statistics functions"""
@@ -175,6 +313,42 @@ class TestExportFunctions(unittest.TestCase):
         self.assertEqual(len(parsed), 2)
         self.assertEqual(parsed[0]['emotion'], 'joy')
     
+    def test_export_dreams_json_fallback(self):
+        """Test the orjson and json encoders produce the same export"""
+        dreams = self.sample_dreams + [{
+            'date': datetime(2025, 1, 13, 5, 0),
+            'text': 'Rêve étrange',
+            'polarity': np.float64(0.25),
+            'sleep_quality': np.int64(6),
+            'themes': np.array(['water']),
+            'scores': np.array([1, 2]),
+            1: None
+        }, {
+            'date': '2025-01-12',
+            'polarity': float('nan'),
+            'subjectivity': np.float64('inf'),
+            'scores': np.array([0.5, np.nan])
+        }]
+        
+        result = export_dreams_advanced(dreams, 'json')
+        with patch('utils.orjson', None):
+            fallback = export_dreams_advanced(dreams, 'json')
+        
+        self.assertEqual(result, fallback)
+        self.assertIn('"2025-01-13 05:00:00"', result)
+        self.assertIn('"polarity": null', result)
+    
+    def test_export_dreams_json_big_int(self):
+        """Test integers beyond 64 bits still export through json"""
+        dreams = [{'date': '2025-01-15', 'word_count': 2 ** 70, 'polarity': float('nan')}]
+        
+        result = export_dreams_advanced(dreams, 'json')
+        with patch('utils.orjson', None):
+            fallback = export_dreams_advanced(dreams, 'json')
+        
+        self.assertEqual(result, fallback)
+        self.assertEqual(json.loads(result)[0]['word_count'], 2 ** 70)
+    
     def test_export_dreams_csv(self):
         """Test CSV export"""
         result = export_dreams_advanced(self.sample_dreams, 'csv')
@@ -204,6 +378,31 @@ class TestExportFunctions(unittest.TestCase):
         
         # Check sentiment stats
         self.assertAlmostEqual(stats['sentiment_stats']['mean_polarity'], 0.05, places=2)
+    
+    def test_calculate_dream_statistics_dataframe_path(self):
+        """Test the DataFrame path agrees with the array path"""
+        expected = calculate_dream_statistics(self.sample_dreams)
+        with patch('utils.STATS_DATAFRAME_MIN_DREAMS', 0):
+            stats = calculate_dream_statistics(self.sample_dreams)
+        self.assertEqual(stats, expected)
+    
+    def test_calculate_dream_statistics_gaps(self):
+        """Test missing and NaN fields are skipped on both paths"""
+        dreams = self.sample_dreams + [
+            {'date': '2025-01-13', 'text': 'No details'},
+            {'date': '2025-01-12', 'polarity': float('nan'), 'lucid': None,
+             'sleep_quality': float('nan')}
+        ]
+        expected = calculate_dream_statistics(dreams)
+        with patch('utils.STATS_DATAFRAME_MIN_DREAMS', 0):
+            stats = calculate_dream_statistics(dreams)
+        
+        for result in (expected, stats):
+            self.assertAlmostEqual(result['sentiment_stats']['mean_polarity'], 0.05, places=2)
+            self.assertEqual(result['sleep_quality_stats']['best_night'], 9)
+            self.assertEqual(result['lucid_dream_stats']['total_lucid'], 1)
+            self.assertNotIsInstance(result['lucid_dream_stats']['total_lucid'], float)
+        self.assertEqual(stats, expected)
 
 class TestErrorHandling(unittest.TestCase):
     """Test error handling functionality"""
@@ -236,6 +435,7 @@ def run_tests():
         TestDataValidator,
         TestDataProcessor,
         TestAdvancedAnalyzer,
+        TestDreamAnalyzer,
         TestExportFunctions,
         TestErrorHandling
     ]
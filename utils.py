@@ -1,49 +1,136 @@
 """
 Utility functions for the AI Dream Journal Analyzer
 """
+import io
+import math
+import operator
 import re
 import json
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from typing import IO, Dict, List, Optional, Tuple, Union
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Handlers and levels are left to the application
 logger = logging.getLogger(__name__)
 
+# Text-processing patterns, compiled once at import
+_BADCHAR_RE = re.compile(r'[^\w\s.,!?;:\-\'"()]')
+_WORD_RE = re.compile(r'\b[a-zA-Z]+\b')
+
+# Common stop words excluded from keyword extraction
+STOP_WORDS = frozenset({
+    'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
+    'by', 'from', 'up', 'about', 'into', 'through', 'during', 'before',
+    'after', 'above', 'below', 'between', 'among', 'throughout', 'despite',
+    'towards', 'upon', 'concerning', 'was', 'were', 'been', 'have', 'has',
+    'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may',
+    'might', 'must', 'can', 'shall', 'this', 'that', 'these', 'those'
+})
+
+# Phrases suggesting the dreamer knew they were dreaming
+LUCIDITY_KEYWORDS = (
+    'realized', 'aware', 'conscious', 'control', 'lucid',
+    'knew i was dreaming', 'reality check', 'dream sign'
+)
+
+# Script tags, javascript: URLs and inline event handlers, in one scan
+_HARMFUL_RE = re.compile(r'<script.*?>.*?</script>|javascript:|on\w+\s*=', re.IGNORECASE | re.DOTALL)
+
+# Column aggregations computed by calculate_dream_statistics
+_STAT_AGGREGATIONS = {
+    'date': ['min', 'max'],
+    'polarity': ['mean', 'std'],
+    'sleep_quality': ['mean', 'max', 'min'],
+    'lucid': ['sum']
+}
+
+# JSON export options for orjson. Both JSON branches write two-space
+# indents, UTF-8 text rather than \u escapes, non-string keys as strings,
+# NaN and infinities as null, NumPy scalars and arrays as plain numbers and
+# lists, and str() for datetimes and anything else. Known differences:
+# orjson renders NumPy datetime64 values as RFC 3339 strings and float32
+# values in their shortest float32 form ('0.1' rather than
+# '0.10000000149011612'). Documents orjson cannot encode, such as integers
+# wider than 64 bits, are written by json instead
+_ORJSON_OPTIONS = (
+    orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY |
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+) if orjson else 0
+
+def _finite_or_none(value):
+    """Copy of a JSON-able value with NaN and infinities replaced by None, as orjson writes them"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite_or_none(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite_or_none(item) for item in value]
+    return value
+
+def _json_default(obj):
+    """json fallback for values it cannot encode, mirroring orjson's options"""
+    # orjson only serializes numeric and bool arrays natively
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in 'biuf':
+        return _finite_or_none(obj.tolist())
+    if isinstance(obj, np.generic) and not isinstance(obj, np.datetime64):
+        return _finite_or_none(obj.item())
+    return str(obj)
+
+# Complexity results kept per AdvancedAnalyzer for recently seen dreams
+COMPLEXITY_CACHE_SIZE = 1024
+
+# One dream's section of the markdown export
+_MARKDOWN_DREAM = (
+    "## Dream {i} - {date}\n\n"
+    "**Text:** {text}\n\n"
+    "**Emotion:** {emotion}\n\n"
+    "**Themes:** {themes}\n\n"
+    "**Sleep Quality:** {sleep_quality}/10\n\n"
+    "---\n\n"
+)
+
+# Journals larger than this are summarised through a DataFrame
+STATS_DATAFRAME_MIN_DREAMS = 10000
+
 class DataValidator:
     """Validates and sanitizes user input data"""
     
     @staticmethod
     def validate_dream_text(text: str) -> Tuple[bool, str]:
         """Validate dream text input"""
-        if not text or not text.strip():
+        stripped = text.strip() if text else ""
+        if not stripped:
             return False, "Dream text cannot be empty"
         
-        if len(text.strip()) < 10:
+        if len(stripped) < 10:
             return False, "Dream description too short (minimum 10 characters)"
         
         if len(text) > 5000:
             return False, "Dream description too long (maximum 5000 characters)"
         
-        # Check for potentially harmful content
-        harmful_patterns = [
-            r'<script.*?>.*?</script>',
-            r'javascript:',
-            r'on\w+\s*=',
-        ]
-        
-        for pattern in harmful_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                return False, "Invalid characters detected"
+        # Check for potentially harmful content. Every pattern needs a '<', ':'
+        # or '=', so text with none of them skips the regex entirely
+        if ('<' in text or ':' in text or '=' in text) and _HARMFUL_RE.search(text):
+            return False, "Invalid characters detected"
         
         return True, "Valid"
     
     @staticmethod
     def validate_sleep_quality(quality: int) -> Tuple[bool, str]:
         """Validate sleep quality rating"""
-        if not isinstance(quality, int):
+        # operator.index accepts any integer type, NumPy ints included
+        try:
+            quality = operator.index(quality)
+        except TypeError:
             return False, "Sleep quality must be a number"
         
         if quality < 1 or quality > 10:
@@ -65,6 +152,49 @@ class DataValidator:
             return True, "Valid"
         except Exception as e:
             return False, f"Invalid date format: {str(e)}"
+    
+    @staticmethod
+    def validate_dates(dates) -> np.ndarray:
+        """Validate many dream dates at once, returning a boolean mask of valid ones
+        
+        Unlike validate_date this also accepts ISO 8601 strings, as read from a
+        CSV import. Anything else that cannot be parsed is marked invalid
+        """
+        try:
+            parsed = pd.to_datetime(dates, errors='coerce', format='ISO8601')
+            # Keep each entry's own calendar day rather than shifting it to UTC
+            if parsed.tz is not None:
+                parsed = parsed.tz_localize(None)
+            days = parsed.to_numpy().astype('datetime64[D]')
+        except (ValueError, TypeError):
+            # Mixed UTC offsets can't share one index, so parse entry by entry
+            days = np.array([_date_day(value) for value in dates], dtype='datetime64[D]')
+        
+        today = np.datetime64(datetime.now().date(), 'D')
+        
+        # Same range rules as validate_date: not in the future, at most 10 years old
+        return ~np.isnat(days) & (days <= today) & (today - days <= np.timedelta64(3650, 'D'))
+
+def _date_day(value) -> np.datetime64:
+    """Calendar day of one date-like value or ISO 8601 string, NaT if unparsable"""
+    try:
+        timestamp = pd.to_datetime(value, errors='coerce', format='ISO8601')
+    except (ValueError, TypeError):
+        return np.datetime64('NaT', 'D')
+    if pd.isna(timestamp):
+        return np.datetime64('NaT', 'D')
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_localize(None)
+    return np.datetime64(timestamp.date(), 'D')
+
+@lru_cache(maxsize=1024)
+def _keywords(text: str, min_length: int) -> Tuple[str, ...]:
+    """Distinct keywords of a text, cached since the same dream is often re-rendered"""
+    # Filter and deduplicate in a single set comprehension
+    return tuple({
+        word for word in _WORD_RE.findall(text.lower())
+        if len(word) >= min_length and word not in STOP_WORDS
+    })
 
 class DataProcessor:
     """Processes and cleans dream data"""
@@ -75,37 +205,42 @@ class DataProcessor:
         if not text:
             return ""
         
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text.strip())
+        # Remove extra whitespace; split() strips and collapses in one C pass
+        text = ' '.join(text.split())
         
         # Remove special characters but keep basic punctuation
-        text = re.sub(r'[^\w\s.,!?;:\-\'"()]', '', text)
+        text = _BADCHAR_RE.sub('', text)
         
         return text
     
     @staticmethod
     def extract_keywords(text: str, min_length: int = 3) -> List[str]:
         """Extract meaningful keywords from dream text"""
-        # Common stop words to exclude
-        stop_words = {
-            'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
-            'by', 'from', 'up', 'about', 'into', 'through', 'during', 'before',
-            'after', 'above', 'below', 'between', 'among', 'throughout', 'despite',
-            'towards', 'upon', 'concerning', 'was', 'were', 'been', 'have', 'has',
-            'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may',
-            'might', 'must', 'can', 'shall', 'this', 'that', 'these', 'those'
-        }
-        
-        # Extract words
-        words = re.findall(r'\b[a-zA-Z]+\b', text.lower())
-        
-        # Filter words
-        keywords = [
-            word for word in words 
-            if len(word) >= min_length and word not in stop_words
-        ]
-        
-        return list(set(keywords))  # Remove duplicates
+        return list(_keywords(text, min_length))
+    
+    @staticmethod
+    def clean_texts(texts: List[str]) -> List[str]:
+        """Clean and normalize many dream texts"""
+        clean = DataProcessor.clean_text
+        return [clean(text) for text in texts]
+    
+    @staticmethod
+    def extract_keywords_batch(texts: List[str], min_length: int = 3) -> List[List[str]]:
+        """Extract keywords from many dream texts"""
+        # Bypasses the cache: a large import would evict the entries that
+        # interactive re-renders rely on
+        extract = _keywords.__wrapped__
+        return [list(extract(text, min_length)) for text in texts]
+
+# Neutral analysis returned when a dream cannot be analyzed. Shared by every
+# error result, so callers must copy it before changing anything
+_FALLBACK_DATA = {
+    'polarity': 0.0,
+    'subjectivity': 0.5,
+    'emotion': 'neutral',
+    'themes': (),
+    'confidence': 0.0
+}
 
 class ErrorHandler:
     """Centralized error handling"""
@@ -113,24 +248,18 @@ class ErrorHandler:
     @staticmethod
     def handle_analysis_error(error: Exception, context: str = "") -> Dict:
         """Handle errors during dream analysis"""
-        logger.error(f"Analysis error in {context}: {str(error)}")
+        logger.error("Analysis error in %s: %s", context, error)
         
         return {
             'success': False,
             'error': f"Analysis failed: {str(error)}",
-            'fallback_data': {
-                'polarity': 0.0,
-                'subjectivity': 0.5,
-                'emotion': 'neutral',
-                'themes': [],
-                'confidence': 0.0
-            }
+            'fallback_data': _FALLBACK_DATA
         }
     
     @staticmethod
     def handle_data_error(error: Exception, operation: str = "") -> Dict:
         """Handle data processing errors"""
-        logger.error(f"Data error in {operation}: {str(error)}")
+        logger.error("Data error in %s: %s", operation, error)
         
         return {
             'success': False,
@@ -156,36 +285,80 @@ class AdvancedAnalyzer:
             'places': ['house', 'school', 'work', 'city', 'forest', 'mountain'],
             'emotions': ['happy', 'sad', 'angry', 'scared', 'excited', 'worried']
         }
+        
+        # Flattened once so the density check is a single loop of substring tests
+        self._symbols = tuple(
+            symbol for symbols in self.dream_symbols.values() for symbol in symbols
+        )
+        
+        # Complexity depends only on the text, so repeat renders of a dream are
+        # free. Keyed by text, least recently used first
+        self._complexity_cache = OrderedDict()
+    
+    @staticmethod
+    def _prepare(text: str) -> Dict:
+        """Text forms shared by the analysis methods, computed once per dream"""
+        return {'text': text, 'lower': text.lower()}
+    
+    def analyze_dream(self, text: str) -> Dict:
+        """Run every analysis on one dream, preparing its text once"""
+        view = self._prepare(text)
+        return {
+            'complexity': self.analyze_dream_complexity(view),
+            'lucidity': self.detect_lucidity_indicators(view)
+        }
     
-    def analyze_dream_complexity(self, text: str) -> Dict:
+    def analyze_dream_complexity(self, text: Union[str, Dict]) -> Dict:
         """Analyze the complexity and richness of a dream"""
-        words = text.split()
-        sentences = text.split('.')
+        view = text if isinstance(text, dict) else None
+        key = view['text'] if view else text
         
-        # Calculate various metrics
+        cache = self._complexity_cache
+        result = cache.get(key)
+        if result is None:
+            # A miss computes from the caller's view when there is one
+            result = self._view_complexity(view or self._prepare(text))
+            cache[key] = result
+            if len(cache) > COMPLEXITY_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+        
+        # Copied so a caller editing the result cannot change the cached entry
+        return dict(result)
+    
+    def analyze_dream_complexity_batch(self, texts: List[str]) -> List[Dict]:
+        """Analyze the complexity of many dreams"""
+        # Reads cached results but stores none, so a large import does not
+        # evict the entries that interactive re-renders rely on
+        cache = self._complexity_cache
+        return [dict(cache[text]) if text in cache else self._view_complexity(self._prepare(text))
+                for text in texts]
+    
+    def _view_complexity(self, view: Dict) -> Dict:
+        """Uncached complexity metrics for one prepared dream"""
+        # Word count, uniqueness and symbols all read the one lowercased copy
+        text_lower = view['lower']
+        words = text_lower.split()
         word_count = len(words)
-        sentence_count = len([s for s in sentences if s.strip()])
+        unique_words = len(set(words))
+        
+        # Calculate various metrics
+        sentence_count = sum(1 for s in view['text'].split('.') if s and not s.isspace())
         avg_sentence_length = word_count / max(sentence_count, 1)
         
+        # Per-word ratios share one reciprocal
+        inv_word_count = 1.0 / max(word_count, 1)
+        
         # Unique word ratio
-        unique_words = len(set(word.lower() for word in words))
-        uniqueness_ratio = unique_words / max(word_count, 1)
+        uniqueness_ratio = unique_words * inv_word_count
         
         # Symbol density
-        symbol_count = 0
-        for category, symbols in self.dream_symbols.items():
-            for symbol in symbols:
-                if symbol in text.lower():
-                    symbol_count += 1
-        
-        symbol_density = symbol_count / max(word_count, 1) * 100
-        
-        # Complexity score (0-100)
-        complexity_score = min(100, (
-            (word_count / 10) * 0.3 +
-            (uniqueness_ratio * 100) * 0.3 +
-            symbol_density * 0.4
-        ))
+        symbol_count = sum(symbol in text_lower for symbol in self._symbols)
+        symbol_density = symbol_count * inv_word_count * 100.0
+        
+        # Complexity score (0-100), weights folded into the terms
+        complexity_score = min(100.0, word_count * 0.03 + uniqueness_ratio * 30.0 + symbol_density * 0.4)
         
         return {
             'word_count': word_count,
@@ -196,19 +369,10 @@ class AdvancedAnalyzer:
             'complexity_score': round(complexity_score, 1)
         }
     
-    def detect_lucidity_indicators(self, text: str) -> Dict:
+    def detect_lucidity_indicators(self, text: Union[str, Dict]) -> Dict:
         """Detect potential lucidity indicators in dream text"""
-        lucidity_keywords = [
-            'realized', 'aware', 'conscious', 'control', 'lucid',
-            'knew i was dreaming', 'reality check', 'dream sign'
-        ]
-        
-        text_lower = text.lower()
-        indicators_found = []
-        
-        for keyword in lucidity_keywords:
-            if keyword in text_lower:
-                indicators_found.append(keyword)
+        text_lower = text['lower'] if isinstance(text, dict) else text.lower()
+        indicators_found = [keyword for keyword in LUCIDITY_KEYWORDS if keyword in text_lower]
         
         lucidity_probability = min(1.0, len(indicators_found) * 0.3)
         
@@ -218,64 +382,161 @@ class AdvancedAnalyzer:
             'likely_lucid': lucidity_probability > 0.5
         }
 
-def export_dreams_advanced(dreams_data: List[Dict], format_type: str = 'json') -> str:
-    """Export dreams with advanced formatting options"""
+def _markdown_parts(dreams_data: List[Dict]) -> List[str]:
+    """Markdown export as a list of string pieces"""
+    parts = ["# Dream Journal Export\n\n"]
+    
+    for i, dream in enumerate(dreams_data, 1):
+        parts.append(_MARKDOWN_DREAM.format(
+            i=i,
+            date=dream.get('date', 'Unknown Date'),
+            text=dream.get('text', 'No description'),
+            emotion=dream.get('emotion', 'Unknown'),
+            themes=', '.join(dream.get('themes', ())),
+            sleep_quality=dream.get('sleep_quality', 'N/A')
+        ))
+    
+    return parts
+
+def export_dreams_advanced(dreams_data: List[Dict], format_type: str = 'json',
+                           out: Optional[IO[str]] = None) -> str:
+    """Export dreams with advanced formatting options
+    
+    When out is given the export is written to it and an empty string is returned
+    """
     try:
-        if format_type.lower() == 'json':
-            return json.dumps(dreams_data, indent=2, default=str)
+        fmt = format_type.lower()
         
-        elif format_type.lower() == 'csv':
-            df = pd.DataFrame(dreams_data)
-            return df.to_csv(index=False)
+        if fmt == 'json' and orjson is not None:
+            # orjson renders the whole document in C, faster than json's
+            # pure-Python indenter, but has no file-writing API
+            try:
+                content = orjson.dumps(dreams_data, option=_ORJSON_OPTIONS, default=str).decode()
+            except orjson.JSONEncodeError:
+                # Beyond orjson, e.g. integers wider than 64 bits; json handles these
+                content = None
+            if content is not None:
+                if out is None:
+                    return content
+                out.write(content)
+                return ''
         
-        elif format_type.lower() == 'markdown':
-            markdown_content = "# Dream Journal Export\n\n"
-            
-            for i, dream in enumerate(dreams_data, 1):
-                markdown_content += f"## Dream {i} - {dream.get('date', 'Unknown Date')}\n\n"
-                markdown_content += f"**Text:** {dream.get('text', 'No description')}\n\n"
-                markdown_content += f"**Emotion:** {dream.get('emotion', 'Unknown')}\n\n"
-                markdown_content += f"**Themes:** {', '.join(dream.get('themes', []))}\n\n"
-                markdown_content += f"**Sleep Quality:** {dream.get('sleep_quality', 'N/A')}/10\n\n"
-                markdown_content += "---\n\n"
-            
-            return markdown_content
+        if fmt == 'markdown':
+            parts = _markdown_parts(dreams_data)
+            if out is None:
+                return ''.join(parts)
+            out.writelines(parts)
+            return ''
+        
+        buffer = io.StringIO() if out is None else out
+        
+        if fmt == 'json':
+            json.dump(_finite_or_none(dreams_data), buffer, indent=2,
+                      ensure_ascii=False, default=_json_default)
+        
+        elif fmt == 'csv':
+            pd.DataFrame(dreams_data).to_csv(buffer, index=False)
         
         else:
             raise ValueError(f"Unsupported format: {format_type}")
+        
+        return buffer.getvalue() if out is None else ''
     
     except Exception as e:
-        logger.error(f"Export error: {str(e)}")
+        logger.error("Export error: %s", e)
         return f"Export failed: {str(e)}"
 
+def _frame_statistics(dreams_data: List[Dict]):
+    """Statistic lookup and polarity array backed by a DataFrame"""
+    df = pd.DataFrame(dreams_data)
+    
+    # One aggregation pass over each column that is present. Aggregating per
+    # column keeps results apart from other columns' dtypes, so the sum of an
+    # object 'lucid' column with gaps stays an integer
+    spec = {column: funcs for column, funcs in _STAT_AGGREGATIONS.items() if column in df.columns}
+    agg = {column: df[column].agg(funcs) for column, funcs in spec.items()}
+    
+    def stat(column, func, default=0):
+        if column not in spec:
+            return default
+        value = agg[column][func]
+        # mean shares the Series, so integer max/min come back as float
+        if func in ('max', 'min', 'sum') and df[column].dtype.kind in 'iub':
+            value = np.int64(value)
+        return value
+    
+    polarity = df['polarity'].to_numpy() if 'polarity' in spec else None
+    return stat, polarity
+
+def _array_statistics(dreams_data: List[Dict]):
+    """Statistic lookup and polarity array backed by plain NumPy arrays"""
+    columns = {}
+    for column in _STAT_AGGREGATIONS:
+        raw = [dream[column] for dream in dreams_data if column in dream]
+        if raw:
+            # pandas skips None and NaN when aggregating, so both are dropped here
+            values = [value for value in raw if not pd.isna(value)]
+            # Dates stay a list: min/max of strings or date objects is a plain comparison
+            columns[column] = values if column == 'date' else np.asarray(values)
+    
+    def stat(column, func, default=0):
+        values = columns.get(column)
+        if values is None:
+            return default
+        if len(values) == 0:
+            # Field present but never set, which is what pandas reports
+            return 0 if func == 'sum' else np.nan
+        if column == 'date':
+            return min(values) if func == 'min' else max(values)
+        if func == 'std':
+            # Sample standard deviation, matching pandas
+            return values.std(ddof=1) if values.size > 1 else np.nan
+        return getattr(values, func)()
+    
+    return stat, columns.get('polarity')
+
 def calculate_dream_statistics(dreams_data: List[Dict]) -> Dict:
     """Calculate comprehensive statistics from dream data"""
     if not dreams_data:
         return {}
     
-    df = pd.DataFrame(dreams_data)
+    total = len(dreams_data)
+    
+    # Building a DataFrame only pays for itself on very large journals
+    if total > STATS_DATAFRAME_MIN_DREAMS:
+        stat, polarity = _frame_statistics(dreams_data)
+    else:
+        stat, polarity = _array_statistics(dreams_data)
+    
+    if polarity is not None:
+        positive_dreams = int(np.count_nonzero(polarity > 0.1))
+        negative_dreams = int(np.count_nonzero(polarity < -0.1))
+    else:
+        positive_dreams = negative_dreams = 0
+    
+    total_lucid = stat('lucid', 'sum')
     
     stats = {
-        'total_dreams': len(df),
+        'total_dreams': total,
         'date_range': {
-            'earliest': df['date'].min() if 'date' in df.columns else None,
-            'latest': df['date'].max() if 'date' in df.columns else None
+            'earliest': stat('date', 'min', None),
+            'latest': stat('date', 'max', None)
         },
         'sentiment_stats': {
-            'mean_polarity': df['polarity'].mean() if 'polarity' in df.columns else 0,
-            'std_polarity': df['polarity'].std() if 'polarity' in df.columns else 0,
-            'positive_dreams': len(df[df['polarity'] > 0.1]) if 'polarity' in df.columns else 0,
-            'negative_dreams': len(df[df['polarity'] < -0.1]) if 'polarity' in df.columns else 0
+            'mean_polarity': stat('polarity', 'mean'),
+            'std_polarity': stat('polarity', 'std'),
+            'positive_dreams': positive_dreams,
+            'negative_dreams': negative_dreams
         },
         'sleep_quality_stats': {
-            'mean_quality': df['sleep_quality'].mean() if 'sleep_quality' in df.columns else 0,
-            'best_night': df['sleep_quality'].max() if 'sleep_quality' in df.columns else 0,
-            'worst_night': df['sleep_quality'].min() if 'sleep_quality' in df.columns else 0
+            'mean_quality': stat('sleep_quality', 'mean'),
+            'best_night': stat('sleep_quality', 'max'),
+            'worst_night': stat('sleep_quality', 'min')
         },
         'lucid_dream_stats': {
-            'total_lucid': df['lucid'].sum() if 'lucid' in df.columns else 0,
-            'lucid_percentage': (df['lucid'].sum() / len(df)) * 100 if 'lucid' in df.columns else 0
+            'total_lucid': total_lucid,
+            'lucid_percentage': total_lucid / total * 100
         }
     }
     
-    return stats
\ No newline at end of file
+    return stats